@@ -592,6 +592,10 @@ app.get('/api/persona/status', (req, res) => {
   res.json(personaDetectionService.getStatus());
 });
 
+app.get('/api/persona/metrics', (req, res) => {
+  res.type('text/plain').send(personaDetectionService.getStatus().detectorMetrics);
+});
+
 app.get('/api/persona/latest', (req, res) => {
   const detection = personaDetectionService.getLastDetection();
   res.json(detection || { message: 'No persona detected yet' });
@@ -802,6 +806,7 @@ server.listen(PORT, () => {
 process.on('SIGINT', () => {
   console.log('\n\nShutting down gracefully...');
   visionService.stopContinuousMonitoring();
+  personaDetectionService.shutdown();
   server.close(() => {
     console.log('Server closed');
     process.exit(0);
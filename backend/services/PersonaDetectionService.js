@@ -5,14 +5,28 @@
  */
 
 const { spawn } = require('child_process');
+const readline = require('readline');
 const path = require('path');
 const fs = require('fs');
 
+// Worker stderr kept for the exit message (cache warnings would otherwise pile up)
+const WORKER_STDERR_TAIL = 8 * 1024;
+
 class PersonaDetectionService {
   constructor() {
     this.pythonScript = path.join(__dirname, '../../cv/persona_detector.py');
+    this.maxDetectionDim = parseInt(process.env.PERSONA_MAX_DETECTION_DIM) || null;
     this.detectionCache = new Map();
     this.lastDetection = null;
+
+    // Long-lived Python worker (spawned lazily on first CV detection)
+    this.worker = null;
+    this.workerReady = null;
+    this.pendingRequests = new Map();
+    this.nextRequestId = 1;
+
+    // Per-stage timing histograms (Prometheus text) from the worker
+    this.detectorMetrics = '';
     
     // Check if Python script exists
     if (!fs.existsSync(this.pythonScript)) {
@@ -81,47 +95,188 @@ class PersonaDetectionService {
   }
 
   /**
-   * Run Python CV detection script
+   * Start the persistent Python detection worker if it is not running.
+   * The worker keeps one PersonaDetector loaded and answers JSON-lines
+   * requests, so each detection only pays for the analysis itself.
    */
-  runPythonDetection(videoPath) {
-    return new Promise((resolve, reject) => {
-      const python = spawn('python3', [
-        this.pythonScript,
-        '--detect-video',
-        videoPath
-      ]);
+  startWorker() {
+    if (this.workerReady) {
+      return this.workerReady;
+    }
+
+    this.workerReady = new Promise((resolve, reject) => {
+      const args = [this.pythonScript, '--worker', '--timings'];
+      if (this.maxDetectionDim) {
+        args.push('--max-detection-dim', String(this.maxDetectionDim));
+      }
+
+      const python = spawn('python3', args);
+      this.worker = python;
 
-      let stdout = '';
       let stderr = '';
+      let ready = false;
+
+      const lines = readline.createInterface({ input: python.stdout });
+      lines.on('line', (line) => {
+        let message;
+        try {
+          message = JSON.parse(line);
+        } catch (error) {
+          console.error('Persona worker sent invalid output:', line);
+          return;
+        }
+
+        if (message.event === 'ready') {
+          ready = true;
+          console.log(`✅ Persona detection worker ready (pid ${message.pid})`);
+          resolve(python);
+          return;
+        }
+
+        const pending = this.pendingRequests.get(message.id);
+        if (!pending) {
+          return;
+        }
+        this.pendingRequests.delete(message.id);
 
-      python.stdout.on('data', (data) => {
-        stdout += data.toString();
+        if (message.ok) {
+          pending.resolve(message.result);
+        } else {
+          pending.reject(new Error(`Python detection error: ${message.error}`));
+        }
       });
 
       python.stderr.on('data', (data) => {
-        stderr += data.toString();
+        stderr = (stderr + data.toString()).slice(-WORKER_STDERR_TAIL);
       });
 
-      python.on('close', (code) => {
-        if (code !== 0) {
-          reject(new Error(`Python script exited with code ${code}: ${stderr}`));
-          return;
+      // A worker that dies mid-write would otherwise raise an unhandled EPIPE
+      python.stdin.on('error', (error) => {
+        if (this.worker === python) {
+          this.resetWorker(new Error(`Python worker stdin failed: ${error.message}`));
         }
+      });
 
-        try {
-          const result = JSON.parse(stdout);
-          result.method = 'cv';
-          result.videoPath = videoPath;
-          resolve(result);
-        } catch (error) {
-          reject(new Error(`Failed to parse Python output: ${error.message}`));
+      python.on('error', (error) => {
+        if (this.worker === python) {
+          this.resetWorker(new Error(`Failed to spawn Python: ${error.message}`));
+        }
+        if (!ready) {
+          reject(new Error(`Failed to spawn Python: ${error.message}`));
         }
       });
 
-      python.on('error', (error) => {
-        reject(new Error(`Failed to spawn Python: ${error.message}`));
+      python.on('close', (code) => {
+        const error = new Error(`Python worker exited with code ${code}: ${stderr}`);
+        if (this.worker === python) {
+          this.resetWorker(error);
+        }
+        if (!ready) {
+          reject(error);
+        }
       });
     });
+
+    return this.workerReady;
+  }
+
+  /**
+   * Forget the current worker and fail any requests still waiting on it.
+   * The next detection will spawn a fresh worker.
+   */
+  resetWorker(error) {
+    this.worker = null;
+    this.workerReady = null;
+
+    for (const pending of this.pendingRequests.values()) {
+      pending.reject(error);
+    }
+    this.pendingRequests.clear();
+  }
+
+  /**
+   * Send a request to the Python worker and wait for its response
+   */
+  async sendWorkerRequest(request) {
+    const python = await this.startWorker();
+    const id = this.nextRequestId++;
+
+    return new Promise((resolve, reject) => {
+      this.pendingRequests.set(id, { resolve, reject });
+      python.stdin.write(JSON.stringify({ id, ...request }) + '\n', (error) => {
+        if (error && this.pendingRequests.delete(id)) {
+          reject(new Error(`Failed to send request to Python worker: ${error.message}`));
+        }
+      });
+    });
+  }
+
+  /**
+   * Run Python CV detection through the persistent worker
+   */
+  async runPythonDetection(videoPath) {
+    // The worker keeps a content-hash keyed cache next to each video,
+    // so results survive backend restarts
+    const result = await this.sendWorkerRequest({
+      op: 'detect_video',
+      path: videoPath,
+      use_cache: true
+    });
+
+    result.method = 'cv';
+    result.videoPath = videoPath;
+    this.refreshMetrics();
+    return result;
+  }
+
+  /**
+   * Detect persona in a single frame (base64 data URL) without writing
+   * it to disk; the worker decodes it in memory.
+   * Frames sharing a streamId (e.g. a camera id) go through a motion gate,
+   * so unchanged frames reuse the previous result (result.reused).
+   */
+  async detectPersonaFromFrame(frameDataUrl, streamId = null) {
+    const request = {
+      op: 'detect_frame',
+      frame: frameDataUrl
+    };
+    if (streamId !== null) {
+      request.stream = streamId;
+    }
+
+    const result = await this.sendWorkerRequest(request);
+
+    result.method = 'cv';
+    this.refreshMetrics();
+    return result;
+  }
+
+  /**
+   * Fetch the worker's per-stage timing histograms in the background
+   * so getStatus() can report them
+   */
+  refreshMetrics() {
+    if (!this.worker) {
+      return;
+    }
+
+    this.sendWorkerRequest({ op: 'metrics' })
+      .then((metrics) => {
+        this.detectorMetrics = metrics.text;
+      })
+      .catch(() => {});
+  }
+
+  /**
+   * Stop the Python worker and fail any requests still waiting on it
+   */
+  shutdown() {
+    const python = this.worker;
+    // Reset first: the close handler ignores workers that are no longer current
+    this.resetWorker(new Error('Persona detection service is shutting down'));
+    if (python) {
+      python.stdin.end(JSON.stringify({ op: 'shutdown' }) + '\n');
+    }
   }
 
   /**
@@ -171,6 +326,9 @@ class PersonaDetectionService {
     return {
       pythonScriptExists: fs.existsSync(this.pythonScript),
       cacheSize: this.detectionCache.size,
+      workerRunning: this.worker !== null,
+      pendingRequests: this.pendingRequests.size,
+      detectorMetrics: this.detectorMetrics,
       lastDetection: this.lastDetection,
       ready: fs.existsSync(this.pythonScript)
     };
@@ -0,0 +1,185 @@
+"""
+Asyncio Facade for the MemoryMesh Persona Detector
+Lets an asyncio service (one web process serving many camera feeds) run
+persona detection without blocking its event loop. Work runs on a bounded
+thread pool; callers wait for a free slot (back-pressure), can time out and
+can be cancelled.
+"""
+
+import asyncio
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from persona_detector import PersonaDetector, decode_frame
+
+
+class DetectorBusyError(RuntimeError):
+    """Raised by block=False calls when every worker and queue slot is taken."""
+
+
+class AsyncPersonaDetector:
+    """
+    Async wrapper around PersonaDetector.
+
+    Each worker thread gets its own detector (cascades and DNN nets keep
+    per-call state), and OpenCV releases the GIL while it works, so the
+    event loop stays responsive. At most max_workers calls run and
+    max_queue more wait for a worker; further callers are held back in
+    acquire (or rejected with block=False).
+
+    Usage:
+        async with AsyncPersonaDetector(max_workers=2) as detector:
+            result = await detector.detect_frame(jpeg_bytes, timeout=0.5)
+    """
+
+    def __init__(self, detector=None, max_workers=1, max_queue=4, **detector_kwargs):
+        """
+        Args:
+            detector: PersonaDetector to use (built from detector_kwargs if
+                None); extra workers get copies of it
+            max_workers: Detection calls running at once
+            max_queue: Calls allowed to wait for a worker before callers
+                are held back
+            **detector_kwargs: PersonaDetector arguments
+        """
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+
+        detector = detector or PersonaDetector(**detector_kwargs)
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.in_flight = 0
+
+        self._idle = queue.SimpleQueue()
+        # Own copies: the detector's pipeline clones are busy whenever it
+        # runs detect_video with pipeline_workers
+        self._idle.put(detector)
+        for _ in range(max_workers - 1):
+            self._idle.put(detector.copy())
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix='persona-detector')
+        self._slots = None
+        self._closed = False
+
+    def _slot_semaphore(self):
+        # Created lazily so it belongs to the running event loop
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_workers + self.max_queue)
+        return self._slots
+
+    @property
+    def busy(self):
+        """True when a new call would have to wait for a slot."""
+        return self.in_flight >= self.max_workers + self.max_queue
+
+    def _run_with_detector(self, fn, args, kwargs):
+        """Executor side: borrow a detector for one call."""
+        detector = self._idle.get()
+        try:
+            return fn(detector, *args, **kwargs)
+        finally:
+            self._idle.put(detector)
+
+    async def _submit(self, fn, args, kwargs, cancel_event=None, block=True):
+        """
+        Run fn(detector, *args, **kwargs) on the pool once a slot is free.
+
+        The slot is held until the work really finishes: a cancelled caller
+        stops waiting right away, but a call already running in a thread
+        keeps its slot (and is asked to stop through cancel_event).
+        """
+        if self._closed:
+            raise RuntimeError("AsyncPersonaDetector is closed")
+
+        slots = self._slot_semaphore()
+        if not block and slots.locked():
+            raise DetectorBusyError("Persona detector queue is full")
+
+        await slots.acquire()
+        loop = asyncio.get_running_loop()
+        self.in_flight += 1
+
+        def release(_):
+            self.in_flight -= 1
+            slots.release()
+
+        try:
+            future = self._executor.submit(self._run_with_detector, fn, args, kwargs)
+        except BaseException:
+            release(None)
+            raise
+        future.add_done_callback(lambda f: loop.call_soon_threadsafe(release, f))
+
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            # Queued calls are dropped by wrap_future; running ones stop early
+            if cancel_event is not None:
+                cancel_event.set()
+            raise
+
+    async def detect_frame(self, frame, all_faces=False, timeout=None, block=True):
+        """
+        Detect the persona in one frame.
+
+        Args:
+            frame: BGR array, encoded image bytes or base64 data URL
+            all_faces: Also report every face
+            timeout: Seconds to wait in total (queueing included) before
+                raising asyncio.TimeoutError
+            block: Wait for a free slot (False raises DetectorBusyError
+                when the queue is full, e.g. to drop a live frame)
+
+        Returns:
+            dict: PersonaDetector.detect_persona_from_frame result
+        """
+        return await asyncio.wait_for(
+            self._submit(_detect_encoded_frame, (frame, all_faces), {}, block=block),
+            timeout
+        )
+
+    async def detect_video(self, video_path, timeout=None, block=True, **detect_kwargs):
+        """
+        Detect the persona in a video file.
+
+        Cancelling the call (or hitting the timeout) stops sampling at the
+        next frame so the worker is freed quickly.
+
+        Args:
+            video_path: Path to the video
+            timeout: Seconds to wait in total before raising
+                asyncio.TimeoutError
+            block: See detect_frame
+            **detect_kwargs: Passed to detect_persona_from_video
+
+        Returns:
+            dict: PersonaDetector.detect_persona_from_video result
+        """
+        cancel_event = threading.Event()
+        detect_kwargs['cancel_event'] = cancel_event
+        return await asyncio.wait_for(
+            self._submit(PersonaDetector.detect_persona_from_video, (video_path,), detect_kwargs,
+                         cancel_event=cancel_event, block=block),
+            timeout
+        )
+
+    async def aclose(self):
+        """Stop accepting calls and wait for the running ones to finish."""
+        self._closed = True
+        await asyncio.get_running_loop().run_in_executor(None, self._executor.shutdown)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+
+def _detect_encoded_frame(detector, frame, all_faces):
+    """Decode (in the worker thread) and detect one frame."""
+    image = decode_frame(frame)
+    if image is None:
+        raise ValueError('Could not decode frame')
+    return detector.detect_persona_from_frame(image, all_faces=all_faces)
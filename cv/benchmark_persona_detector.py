@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+"""
+Benchmark Suite for the MemoryMesh Persona Detector
+Builds synthetic test videos locally and measures detect_faces,
+detect_persona_from_frame and detect_persona_from_video throughput,
+latency percentiles and peak memory. Results are written as JSON so runs
+can be compared.
+"""
+
+import argparse
+import contextlib
+import json
+import platform
+import resource
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from persona_detector import PersonaDetector
+
+
+def parse_resolution(value):
+    """Parse '1920x1080' into (1920, 1080)."""
+    width, height = value.lower().split('x')
+    return int(width), int(height)
+
+
+def draw_synthetic_face(frame, center, size):
+    """Draw a simple elderly face (gray hair, skin, eyes, mouth) on a frame."""
+    cx, cy = center
+    axes = (int(size * 0.4), int(size * 0.5))
+
+    cv2.ellipse(frame, (cx, cy - int(size * 0.2)), (int(size * 0.45), int(size * 0.4)),
+                0, 180, 360, (200, 200, 200), -1)  # Gray hair
+    cv2.ellipse(frame, (cx, cy), axes, 0, 0, 360, (150, 175, 210), -1)  # Skin
+
+    eye_dy = int(size * 0.1)
+    eye_dx = int(size * 0.15)
+    eye_r = max(2, int(size * 0.05))
+    cv2.circle(frame, (cx - eye_dx, cy - eye_dy), eye_r, (40, 40, 40), -1)
+    cv2.circle(frame, (cx + eye_dx, cy - eye_dy), eye_r, (40, 40, 40), -1)
+
+    cv2.ellipse(frame, (cx, cy + int(size * 0.22)), (int(size * 0.15), int(size * 0.05)),
+                0, 0, 360, (60, 60, 140), -1)  # Mouth
+
+
+def make_synthetic_video(path, width, height, seconds, fps=30, face_image=None):
+    """
+    Write a synthetic test video with a slowly moving face.
+
+    Args:
+        path: Output .mp4 path
+        width, height: Frame size
+        seconds: Video length
+        fps: Frame rate
+        face_image: Optional BGR face photo to composite instead of the
+            drawn face (the drawn face measures cost, not accuracy)
+
+    Returns:
+        int: Number of frames written
+    """
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    if not writer.isOpened():
+        raise RuntimeError(f"Could not open video writer for {path}")
+
+    # Textured background so the cascade has realistic work to do
+    rng = np.random.default_rng(0)
+    background = rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+    background = cv2.GaussianBlur(background, (0, 0), 8)
+
+    face_size = max(40, height // 4)
+    if face_image is not None:
+        face_image = cv2.resize(face_image, (face_size, face_size), interpolation=cv2.INTER_AREA)
+
+    frame_count = int(seconds * fps)
+    for i in range(frame_count):
+        frame = background.copy()
+
+        # Drift horizontally across the middle of the frame
+        travel = max(1, width - 2 * face_size)
+        x = face_size + (i * 3) % travel
+        y = height // 2
+
+        if face_image is not None:
+            top = y - face_size // 2
+            left = x - face_size // 2
+            frame[top:top + face_size, left:left + face_size] = face_image
+        else:
+            draw_synthetic_face(frame, (x, y), face_size)
+
+        writer.write(frame)
+
+    writer.release()
+    return frame_count
+
+
+def read_frames(path, count):
+    """Decode up to `count` evenly spaced frames from a video."""
+    cap = cv2.VideoCapture(str(path))
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) or count
+    stride = max(1, total // count)
+    frames = []
+
+    index = 0
+    while len(frames) < count:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        if index % stride == 0:
+            frames.append(frame)
+        index += 1
+
+    cap.release()
+    return frames
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS reports bytes
+    if sys.platform == 'darwin':
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+
+def current_rss_mb():
+    """Current resident set size of this process in MB, or None if unknown."""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None  # No /proc (e.g. macOS)
+    return pages * resource.getpagesize() / (1024 * 1024)
+
+
+class RssSampler:
+    """
+    Track the RSS peak of one benchmark stage.
+
+    ru_maxrss is a process-wide high-water mark, so it cannot tell stages
+    apart. This polls the current RSS on a background thread while the
+    stage runs and reports how far it rose above its starting level, which
+    also covers OpenCV's native allocations that tracemalloc cannot see.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.start_mb = None
+        self.peak_mb = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        rss = current_rss_mb()
+        if rss is not None and (self.peak_mb is None or rss > self.peak_mb):
+            self.peak_mb = rss
+
+    def _poll(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self):
+        self.start_mb = current_rss_mb()
+        self.peak_mb = self.start_mb
+        if self.start_mb is not None:
+            self._thread = threading.Thread(target=self._poll, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._sample()
+        return False
+
+    def stats(self):
+        """RSS at stage start, peak during the stage and the growth, in MB."""
+        if self.start_mb is None:
+            return {'rss_start_mb': None, 'rss_peak_mb': None, 'rss_growth_mb': None}
+        return {
+            'rss_start_mb': self.start_mb,
+            'rss_peak_mb': self.peak_mb,
+            'rss_growth_mb': self.peak_mb - self.start_mb
+        }
+
+
+def latency_stats(latencies, items=None, rss=None):
+    """
+    Summarize per-call latencies (seconds).
+
+    Args:
+        latencies: List of call durations in seconds
+        items: Items processed per call (defaults to 1 each), used for
+            throughput
+        rss: RssSampler that wrapped the calls, for the stage's memory use
+    """
+    latencies = np.asarray(latencies, dtype=np.float64)
+    total_time = float(latencies.sum())
+    total_items = float(np.sum(items)) if items is not None else float(len(latencies))
+
+    stats = {
+        'calls': int(len(latencies)),
+        'throughput_per_s': total_items / total_time if total_time > 0 else 0.0,
+        'mean_ms': float(latencies.mean() * 1000),
+        'p50_ms': float(np.percentile(latencies, 50) * 1000),
+        'p95_ms': float(np.percentile(latencies, 95) * 1000),
+        'p99_ms': float(np.percentile(latencies, 99) * 1000),
+        'max_ms': float(latencies.max() * 1000)
+    }
+    if rss is not None:
+        stats.update(rss.stats())
+    return stats
+
+
+def time_calls(fn, inputs, repeats=1, warmup=1):
+    """Call fn on every input `repeats` times and return the latencies."""
+    for item in inputs[:warmup]:
+        fn(item)
+
+    latencies = []
+    for _ in range(repeats):
+        for item in inputs:
+            start = time.perf_counter()
+            fn(item)
+            latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def run_benchmarks(args):
+    """Run all benchmarks and return the JSON-ready report."""
+    face_image = cv2.imread(args.face_image) if args.face_image else None
+    if args.face_image and face_image is None:
+        raise SystemExit(f"Could not read face image: {args.face_image}")
+
+    # Keep stdout clean for the JSON report
+    with contextlib.redirect_stdout(sys.stderr):
+        detector = PersonaDetector(max_detection_dim=args.max_detection_dim, backend=args.backend)
+
+    video_kwargs = {
+        'stride_frames': args.stride_frames,
+        'max_frames': args.max_frames,
+        'sampling': args.sampling,
+        'early_stop': args.early_stop,
+        'track_faces': args.track_faces,
+        'pipeline_workers': args.pipeline_workers
+    }
+
+    report = {
+        'generated_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'processor': platform.processor(),
+            'cpu_count': cv2.getNumberOfCPUs(),
+            'opencv': cv2.__version__,
+            'opencv_threads': cv2.getNumThreads(),
+            'numpy': np.__version__
+        },
+        'detector': {
+            'backend': 'dnn' if detector.dnn_loaded else 'haar',
+            'max_detection_dim': args.max_detection_dim
+        },
+        'video_kwargs': video_kwargs,
+        'results': []
+    }
+
+    with tempfile.TemporaryDirectory(prefix='persona_bench_') as tmp_dir:
+        for width, height in args.resolutions:
+            for seconds in args.durations:
+                video_path = Path(tmp_dir) / f"synthetic_{width}x{height}_{seconds}s.mp4"
+                frame_count = make_synthetic_video(video_path, width, height, seconds,
+                                                   fps=args.fps, face_image=face_image)
+
+                print(f"Benchmarking {width}x{height}, {seconds}s ({frame_count} frames)...",
+                      file=sys.stderr)
+
+                frames = read_frames(video_path, args.frames)
+
+                with RssSampler() as faces_rss:
+                    faces = time_calls(detector.detect_faces, frames, repeats=args.repeats)
+                with RssSampler() as frame_rss:
+                    frame_results = time_calls(detector.detect_persona_from_frame, frames,
+                                               repeats=args.repeats)
+
+                video_latencies = []
+                frames_analyzed = []
+                last_result = None
+                with RssSampler() as video_rss:
+                    for _ in range(args.video_repeats):
+                        start = time.perf_counter()
+                        last_result = detector.detect_persona_from_video(video_path, **video_kwargs)
+                        video_latencies.append(time.perf_counter() - start)
+                        frames_analyzed.append(last_result.get('frames_analyzed', last_result['samples']))
+
+                video_stats = latency_stats(video_latencies, items=frames_analyzed, rss=video_rss)
+                video_stats['video_frames_per_s'] = frame_count * len(video_latencies) / sum(video_latencies)
+                video_stats['last_result'] = last_result
+
+                report['results'].append({
+                    'resolution': f"{width}x{height}",
+                    'duration_s': seconds,
+                    'video_frames': frame_count,
+                    'detect_faces': latency_stats(faces, rss=faces_rss),
+                    'detect_persona_from_frame': latency_stats(frame_results, rss=frame_rss),
+                    'detect_persona_from_video': video_stats
+                })
+
+    report['peak_rss_mb'] = peak_rss_mb()
+    return report
+
+
+def print_summary(report):
+    """Print a human-readable table of the report to stderr."""
+    print("\n" + "="*78, file=sys.stderr)
+    print("📊 PERSONA DETECTOR BENCHMARK", file=sys.stderr)
+    print("="*78, file=sys.stderr)
+    print(f"{'video':<22}{'stage':<28}{'per s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+          f"{'+RSS MB':>9}", file=sys.stderr)
+
+    for entry in report['results']:
+        label = f"{entry['resolution']} {entry['duration_s']}s"
+        for stage in ('detect_faces', 'detect_persona_from_frame', 'detect_persona_from_video'):
+            stats = entry[stage]
+            growth = stats.get('rss_growth_mb')
+            growth = f"{growth:>9.1f}" if growth is not None else f"{'n/a':>9}"
+            print(f"{label:<22}{stage:<28}{stats['throughput_per_s']:>9.1f}"
+                  f"{stats['p50_ms']:>9.1f}{stats['p95_ms']:>9.1f}{stats['p99_ms']:>9.1f}{growth}",
+                  file=sys.stderr)
+
+    print(f"\nProcess peak RSS (all stages): {report['peak_rss_mb']:.1f} MB", file=sys.stderr)
+    print("="*78 + "\n", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the MemoryMesh persona detector on synthetic videos')
+    parser.add_argument('--resolutions', type=lambda v: [parse_resolution(r) for r in v.split(',')],
+                       default=[(640, 360), (1280, 720), (1920, 1080)],
+                       help='Comma-separated WIDTHxHEIGHT list (default: 640x360,1280x720,1920x1080)')
+    parser.add_argument('--durations', type=lambda v: [float(d) for d in v.split(',')],
+                       default=[4.0, 12.0],
+                       help='Comma-separated video lengths in seconds (default: 4,12)')
+    parser.add_argument('--fps', type=int, default=30, help='Synthetic video frame rate')
+    parser.add_argument('--frames', type=int, default=20,
+                       help='Frames per video used for the per-frame benchmarks')
+    parser.add_argument('--repeats', type=int, default=1,
+                       help='Passes over the frames for the per-frame benchmarks')
+    parser.add_argument('--video-repeats', type=int, default=3,
+                       help='Runs of detect_persona_from_video per video')
+    parser.add_argument('--face-image', help='Face photo to composite instead of the drawn face')
+    parser.add_argument('--max-detection-dim', type=int, help='PersonaDetector max_detection_dim')
+    parser.add_argument('--backend', choices=PersonaDetector.BACKENDS, default='auto',
+                       help='PersonaDetector backend')
+    parser.add_argument('--stride-frames', type=int, default=15)
+    parser.add_argument('--max-frames', type=int, default=50)
+    parser.add_argument('--sampling', choices=PersonaDetector.SAMPLING_MODES, default='grab')
+    parser.add_argument('--early-stop', action='store_true')
+    parser.add_argument('--track-faces', action='store_true')
+    parser.add_argument('--pipeline-workers', type=int,
+                       help='Analysis threads fed by a decoder thread (default: no pipeline)')
+    parser.add_argument('--output', help='Write the JSON report here (default: stdout)')
+
+    args = parser.parse_args()
+
+    report = run_benchmarks(args)
+    print_summary(report)
+
+    content = json.dumps(report, indent=2, default=str)
+    if args.output:
+        Path(args.output).write_text(content + '\n')
+        print(f"📁 Report saved to: {args.output}", file=sys.stderr)
+    else:
+        print(content)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,502 @@
+#!/usr/bin/env python3
+"""
+Multi-Camera Scheduler for MemoryMesh
+Runs PersonaDetector over several camera or video sources on one shared
+worker pool. Sources have priorities (stove and kitchen cameras first), and
+each source's sampling rate is adapted so the detector's total CPU use stays
+under a budget. Achieved fps is reported per source.
+"""
+
+import argparse
+import collections
+import contextlib
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+from persona_detector import (FaceTracker, MotionGate, PersonaDetector, PersonaVote, RegionMask,
+                              _json_default, load_roi)
+
+
+class CameraSource:
+    """
+    One camera or video feed handled by a CameraScheduler.
+
+    Sampling never slows the feed down. Video files play on a real-time
+    clock from the moment they are opened, and each read skips to the
+    frame due at that time. Live cameras and streams drop the frames the
+    driver buffered since the last read, so the newest frame is analyzed
+    (CAP_PROP_BUFFERSIZE alone is ignored by many backends).
+    """
+
+    # Gaps up to this many frames are skipped with grab(), longer ones by seeking
+    MAX_GRAB_SKIP = 30
+    # Upper bound on buffered live frames dropped per read
+    MAX_DRAIN_FRAMES = 64
+
+    def __init__(self, name, source, priority=1, min_fps=0.2, max_fps=5.0,
+                 track_faces=False, motion_gate=False, roi='auto', live=None):
+        """
+        Args:
+            name: Label used in stats and callbacks
+            source: cv2.VideoCapture source (camera index, file path or
+                stream URL) or any iterable of BGR frames
+            priority: Higher priorities are dispatched first and get spare
+                CPU budget first
+            min_fps: Rate kept even when over budget
+            max_fps: Rate never exceeded
+            track_faces: Carry a FaceTracker across this source's frames
+            motion_gate: Reuse results for unchanged frames (MotionGate)
+            roi: RegionMask limiting detection to parts of this camera's
+                frames; 'auto' loads the .roi.json sidecar of a file
+                source (see load_roi), None scans whole frames
+            live: True for cameras and streams (drain to the newest frame),
+                False for files (real-time playback clock); None treats
+                existing file paths as files and everything else as live
+        
+        Raises:
+            ValueError: Bad fps limits or an invalid ROI sidecar
+        """
+        if not 0 < min_fps <= max_fps:
+            raise ValueError("Need 0 < min_fps <= max_fps")
+
+        self.name = name
+        self.source = source
+        self.priority = priority
+        self.min_fps = min_fps
+        self.max_fps = max_fps
+        self.target_fps = max_fps
+        self.tracker = FaceTracker() if track_faces else None
+        self.motion_gate = MotionGate() if motion_gate else None
+        if roi == 'auto':
+            roi = load_roi(source) if isinstance(source, str) else None
+        self.roi = roi
+        if live is None:
+            live = not (isinstance(source, str) and os.path.isfile(source))
+        self.live = live
+        self.vote = PersonaVote()
+
+        self.cost = None  # Running average CPU seconds per analyzed frame
+        self.frames = 0
+        self.skipped = 0  # Frames dropped to keep up with the feed
+        self.errors = 0
+        self.last_error = None
+        self.last_result = None
+        self.finished = False
+        self.busy = False
+        self.next_due = 0.0
+
+        self._completed = collections.deque()
+        self._planned_frames = 0
+        self._capture = None
+        self._frames = None
+        self._fps = None
+        self._opened_at = None
+        self._position = 0  # Index of the next frame the capture returns
+
+    def open(self):
+        """
+        Open the capture or frame iterator.
+
+        A source that cannot be opened is marked finished with its error
+        instead of stopping the other sources.
+        """
+        try:
+            self._open()
+        except Exception as e:
+            self.finished = True
+            self.errors += 1
+            self.last_error = str(e)
+            print(f"⚠️  Camera {self.name}: {e}", file=sys.stderr)
+
+    def _open(self):
+        if isinstance(self.source, (int, str)):
+            self._capture = cv2.VideoCapture(self.source)
+            if not self._capture.isOpened():
+                raise RuntimeError(f"Could not open source {self.source!r}")
+            self._fps = self._capture.get(cv2.CAP_PROP_FPS) or 25.0
+            self._opened_at = time.monotonic()
+            if self.live:
+                # Honoured by some backends only, read() drains the rest
+                self._capture.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        else:
+            self._frames = iter(self.source)
+
+    def read(self):
+        """Frame due now, or None at the end of the source."""
+        if self._capture is None:
+            return next(self._frames, None)
+
+        if self.live:
+            return self._read_newest()
+
+        # Skip to the frame the real-time clock has reached
+        due = int((time.monotonic() - self._opened_at) * self._fps)
+        gap = due - self._position
+        if gap > self.MAX_GRAB_SKIP:
+            self._capture.set(cv2.CAP_PROP_POS_MSEC, due / self._fps * 1000)
+        elif gap > 0:
+            for _ in range(gap):
+                if not self._capture.grab():
+                    return None
+        if gap > 0:
+            self.skipped += gap
+            self._position = due
+
+        ok, frame = self._capture.read()
+        self._position += 1
+        return frame if ok else None
+
+    def _read_newest(self):
+        """
+        Drop buffered live frames and return the newest one.
+
+        A grab() that returns well within a frame interval came from the
+        driver's buffer; the first one that has to wait for the camera
+        (or MAX_DRAIN_FRAMES) marks the newest frame.
+        """
+        buffered = 0.5 / self._fps
+        for grabbed in range(self.MAX_DRAIN_FRAMES):
+            start = time.monotonic()
+            if not self._capture.grab():
+                return None
+            if time.monotonic() - start >= buffered:
+                break
+        self.skipped += grabbed
+
+        ok, frame = self._capture.retrieve()
+        return frame if ok else None
+
+    def close(self):
+        if self._capture is not None:
+            self._capture.release()
+            self._capture = None
+
+    def record(self, result, cost, now):
+        self.frames += 1
+        self.last_result = result
+        self.vote.add(result['persona'])
+        self.cost = cost if self.cost is None else 0.8 * self.cost + 0.2 * cost
+        self._completed.append(now)
+
+    def achieved_fps(self, now, window, started):
+        """Analyzed frames per second over the last `window` seconds."""
+        while self._completed and self._completed[0] < now - window:
+            self._completed.popleft()
+        span = min(window, now - started)
+        return len(self._completed) / span if span > 0 else 0.0
+
+
+class CameraScheduler:
+    """
+    Shares a fixed pool of detector workers between camera sources.
+
+    The dispatcher hands the next due source with the highest priority to
+    a free worker; a source is never analyzed by two workers at once, so
+    its tracker and motion gate see frames in order. Every control_interval
+    the scheduler measures the process CPU time and re-plans the rates:
+    every source keeps min_fps, and the rest of cpu_budget goes to sources
+    in priority order, up to their max_fps. Per-frame costs are measured
+    on the worker threads and scaled to the measured process CPU, which
+    also covers OpenCV's own threads.
+    """
+
+    def __init__(self, detector=None, workers=2, cpu_budget=1.0, control_interval=2.0,
+                 fps_window=10.0, on_result=None, **detector_kwargs):
+        """
+        Args:
+            detector: PersonaDetector for the first worker (built from
+                detector_kwargs if None); other workers get copies
+            workers: Detection threads shared by all sources
+            cpu_budget: CPU cores the scheduler may keep busy (process CPU
+                seconds per wall second)
+            control_interval: Seconds between rate adjustments
+            fps_window: Seconds of history behind achieved_fps
+            on_result: Called as on_result(source_name, result) from the
+                worker threads
+            **detector_kwargs: PersonaDetector arguments
+        """
+        detector = detector or PersonaDetector(**detector_kwargs)
+        self.workers = workers
+        self.cpu_budget = cpu_budget
+        self.control_interval = control_interval
+        self.fps_window = fps_window
+        self.on_result = on_result
+        self.sources = []
+        self.cpu_usage = 0.0
+        self.calibration = 1.0
+
+        self._idle = queue.SimpleQueue()
+        self._idle.put(detector)
+        for _ in range(workers - 1):
+            self._idle.put(detector.copy())
+
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._executor = None
+        self._thread = None
+        self._started = None
+
+    def add_source(self, name, source, **source_kwargs):
+        """Add a source (see CameraSource for the arguments)."""
+        camera = CameraSource(name, source, **source_kwargs)
+        if self._thread is not None:
+            # Open before the dispatcher can see it; RTSP opens take seconds
+            camera.open()
+        with self._lock:
+            self.sources.append(camera)
+        return camera
+
+    def start(self):
+        """Open the sources and start dispatching in a background thread."""
+        for camera in self.sources:
+            camera.open()
+
+        self._started = time.monotonic()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                            thread_name_prefix='camera-worker')
+        self._thread = threading.Thread(target=self._dispatch, name='camera-scheduler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop dispatching and wait for running analyses."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._executor.shutdown()
+        for camera in self.sources:
+            camera.close()
+
+    def run(self, duration=None, report_interval=None, report=None):
+        """
+        Run until every source has ended or duration seconds have passed.
+
+        Args:
+            duration: Stop after this many seconds (None for no limit)
+            report_interval: Call report(stats()) this often
+            report: Stats callback for report_interval
+
+        Returns:
+            dict: Final stats()
+        """
+        self.start()
+        deadline = None if duration is None else time.monotonic() + duration
+        next_report = time.monotonic() + (report_interval or 0)
+
+        try:
+            while not all(camera.finished for camera in self.sources):
+                now = time.monotonic()
+                if deadline is not None and now >= deadline:
+                    break
+                if report_interval and report and now >= next_report:
+                    report(self.stats())
+                    next_report = now + report_interval
+                time.sleep(0.05)
+        finally:
+            self.stop()
+
+        return self.stats()
+
+    def _dispatch(self):
+        last_cpu = time.process_time()
+        last_wall = time.monotonic()
+        next_control = last_wall + self.control_interval
+
+        while not self._stop.is_set():
+            now = time.monotonic()
+
+            if now >= next_control:
+                cpu = time.process_time()
+                self.cpu_usage = (cpu - last_cpu) / (now - last_wall)
+                self._rebalance(now - last_wall)
+                last_cpu, last_wall = cpu, now
+                next_control = now + self.control_interval
+
+            with self._lock:
+                due = [camera for camera in self.sources
+                       if not camera.busy and not camera.finished and camera.next_due <= now]
+                waiting = [camera.next_due for camera in self.sources
+                           if not camera.busy and not camera.finished]
+
+            if due:
+                try:
+                    detector = self._idle.get_nowait()
+                except queue.Empty:
+                    detector = None
+
+                if detector is not None:
+                    camera = max(due, key=lambda c: (c.priority, -c.next_due))
+                    camera.busy = True
+                    camera.next_due = now + 1.0 / camera.target_fps
+                    self._executor.submit(self._analyze, camera, detector)
+                    continue
+
+            # Sleep until a worker frees up, a source is due or it is time
+            # to re-plan
+            wait = next_control - now
+            if waiting and not due:
+                wait = min(wait, min(waiting) - now)
+            self._wake.wait(max(0.001, min(wait, 0.1)))
+            self._wake.clear()
+
+    def _analyze(self, camera, detector):
+        cpu_start = time.thread_time()
+        try:
+            frame = camera.read()
+            if frame is None:
+                camera.finished = True
+                return
+
+            result = detector.detect_persona_from_frame(frame, tracker=camera.tracker,
+                                                        motion_gate=camera.motion_gate,
+                                                        roi=camera.roi)
+            camera.record(result, time.thread_time() - cpu_start, time.monotonic())
+
+            if self.on_result is not None:
+                self.on_result(camera.name, result)
+        except Exception as e:
+            camera.errors += 1
+            camera.last_error = str(e)
+        finally:
+            camera.busy = False
+            self._idle.put(detector)
+            self._wake.set()
+
+    def _rebalance(self, elapsed):
+        """Re-plan every source's target fps to fit the CPU budget."""
+        with self._lock:
+            sources = list(self.sources)
+
+        # Worker-thread costs miss OpenCV's internal threads and decoding
+        # done elsewhere; scale them to what the process really used
+        predicted = 0.0
+        for camera in sources:
+            frames = camera.frames - camera._planned_frames
+            camera._planned_frames = camera.frames
+            if camera.cost is not None:
+                predicted += camera.cost * frames / elapsed
+        if predicted > 0 and self.cpu_usage > 0:
+            self.calibration = 0.7 * self.calibration + 0.3 * (self.cpu_usage / predicted)
+
+        measured = [camera for camera in sources if camera.cost is not None and not camera.finished]
+        remaining = self.cpu_budget
+        for camera in measured:
+            camera.target_fps = camera.min_fps
+            remaining -= camera.cost * self.calibration * camera.min_fps
+
+        for camera in sorted(measured, key=lambda c: -c.priority):
+            frame_cpu = max(camera.cost * self.calibration, 1e-6)
+            extra = min(camera.max_fps - camera.min_fps, max(0.0, remaining) / frame_cpu)
+            camera.target_fps += extra
+            remaining -= extra * frame_cpu
+
+    def stats(self):
+        """Per-source rates and results plus the overall CPU use."""
+        now = time.monotonic()
+        started = self._started or now
+        sources = {}
+
+        for camera in list(self.sources):
+            sources[camera.name] = {
+                'priority': camera.priority,
+                'target_fps': round(camera.target_fps, 3),
+                'achieved_fps': round(camera.achieved_fps(now, self.fps_window, started), 3),
+                'frames': camera.frames,
+                'skipped_frames': camera.skipped,
+                'errors': camera.errors,
+                'last_error': camera.last_error,
+                'frame_cpu_ms': round((camera.cost or 0.0) * self.calibration * 1000, 2),
+                'persona': camera.vote.result(),
+                'roi': (camera.last_result or {}).get('roi'),
+                'finished': camera.finished
+            }
+
+        return {
+            'elapsed_s': round(now - started, 2),
+            'workers': self.workers,
+            'cpu_budget': self.cpu_budget,
+            'cpu_usage': round(self.cpu_usage, 3),
+            'sources': sources
+        }
+
+
+def parse_source(value):
+    """Parse NAME=SOURCE[@PRIORITY]; numeric sources are camera indexes."""
+    name, _, spec = value.partition('=')
+    if not name or not spec:
+        raise argparse.ArgumentTypeError(f"Expected NAME=SOURCE[@PRIORITY], got {value!r}")
+
+    source, _, priority = spec.rpartition('@') if '@' in spec else (spec, '', '1')
+    if not priority.lstrip('-').isdigit():
+        # The @ belonged to the source (e.g. rtsp://user@host)
+        source, priority = spec, '1'
+
+    return name, int(source) if source.isdigit() else source, int(priority)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Schedule persona detection over several cameras')
+    parser.add_argument('--source', action='append', type=parse_source, required=True,
+                       metavar='NAME=SOURCE[@PRIORITY]',
+                       help='Camera index, video file or stream URL; repeat per source')
+    parser.add_argument('--workers', type=int, default=2, help='Shared detection threads')
+    parser.add_argument('--cpu-budget', type=float, default=1.0,
+                       help='CPU cores the detector may use')
+    parser.add_argument('--min-fps', type=float, default=0.2)
+    parser.add_argument('--max-fps', type=float, default=5.0)
+    parser.add_argument('--duration', type=float, help='Stop after this many seconds')
+    parser.add_argument('--report-interval', type=float, default=5.0,
+                       help='Print stats to stderr this often')
+    parser.add_argument('--track-faces', action='store_true')
+    parser.add_argument('--motion-gate', action='store_true')
+    parser.add_argument('--roi', action='append', default=[], metavar='NAME=ROI_JSON',
+                       help='Region-of-interest file for a source (file sources also '
+                            'pick up their own .roi.json sidecar)')
+    parser.add_argument('--max-detection-dim', type=int,
+                       help='PersonaDetector max_detection_dim')
+    parser.add_argument('--backend', choices=PersonaDetector.BACKENDS, default='auto',
+                       help='PersonaDetector backend')
+
+    args = parser.parse_args()
+
+    masks = {}
+    for value in args.roi:
+        name, _, path = value.partition('=')
+        if not name or not path:
+            parser.error(f"--roi expects NAME=ROI_JSON, got {value!r}")
+        masks[name] = RegionMask.load(path)
+
+    with contextlib.redirect_stdout(sys.stderr):
+        scheduler = CameraScheduler(workers=args.workers, cpu_budget=args.cpu_budget,
+                                    max_detection_dim=args.max_detection_dim, backend=args.backend)
+
+    for name, source, priority in args.source:
+        scheduler.add_source(name, source, priority=priority, min_fps=args.min_fps,
+                             max_fps=args.max_fps, track_faces=args.track_faces,
+                             motion_gate=args.motion_gate, roi=masks.get(name, 'auto'))
+
+    def report(stats):
+        rates = ', '.join(f"{name} {s['achieved_fps']:.2f}/{s['target_fps']:.2f}fps"
+                          for name, s in stats['sources'].items())
+        print(f"📹 cpu {stats['cpu_usage']:.2f}/{stats['cpu_budget']:.2f} | {rates}", file=sys.stderr)
+
+    try:
+        stats = scheduler.run(duration=args.duration, report_interval=args.report_interval,
+                              report=report)
+    except KeyboardInterrupt:
+        scheduler.stop()
+        stats = scheduler.stats()
+
+    print(json.dumps(stats, indent=2, default=_json_default))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+"""
+Local Persona Detection Service for MemoryMesh
+Small HTTP service (TCP or Unix socket) around PersonaDetector that gathers
+frame requests from several clients over a short window and runs them as
+one detect_personas_in_frames batch, so several cameras per home share one
+detector with a bounded latency.
+
+Endpoints:
+    POST /detect   image bytes (Content-Type image/*, ?all_faces=1) or JSON
+                   {"frame": "<data URL or base64>", "all_faces": false}
+    GET  /metrics  batching and latency statistics (JSON)
+    GET  /health   {"ok": true}
+"""
+
+import argparse
+import collections
+import contextlib
+import json
+import os
+import queue
+import socketserver
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from persona_detector import PersonaDetector, decode_frame, _json_default
+
+
+class OverBudgetError(RuntimeError):
+    """The request could no longer be answered within the latency budget."""
+
+
+class _FrameRequest:
+    __slots__ = ('frame', 'all_faces', 'arrival', 'done', 'result', 'error', 'cancelled')
+
+    def __init__(self, frame, all_faces):
+        self.frame = frame
+        self.all_faces = all_faces
+        self.arrival = time.monotonic()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.cancelled = False  # Caller gave up; skip it if still queued
+
+
+class MicroBatcher:
+    """
+    Gathers frames submitted from many threads into batches.
+
+    A batch opens with the first waiting request and closes when window_ms
+    have passed since that request arrived, when max_batch frames are
+    collected, or when more frames would push the oldest request past
+    latency_budget_ms (estimated from a running average of the per-frame
+    cost). Under overload, requests that can no longer finish within the
+    budget are rejected (OverBudgetError) instead of answered late, which
+    keeps the tail latency of served requests bounded. Requests whose caller
+    timed out are dropped from the queue rather than run. One thread runs
+    the batches, so the detector is never shared.
+    """
+
+    def __init__(self, detector, window_ms=5, max_batch=8, latency_budget_ms=None,
+                 history=1000):
+        """
+        Args:
+            detector: PersonaDetector used by the batch thread
+            window_ms: How long the first request of a batch waits for
+                company
+            max_batch: Largest batch
+            latency_budget_ms: Target latency from arrival to result; caps
+                batch sizes once the per-frame cost is known (None for no cap)
+            history: Latencies and batch sizes kept for the metrics
+        """
+        self.detector = detector
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.latency_budget = latency_budget_ms / 1000 if latency_budget_ms else None
+        self.frame_cost = None  # Running average, seconds per frame
+        self.requests = 0
+        self.batches = 0
+        self.shed = 0
+        self.cancelled = 0
+        self.latencies = collections.deque(maxlen=history)
+        self.batch_sizes = collections.deque(maxlen=history)
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name='persona-batcher', daemon=True)
+        self._thread.start()
+
+    def submit(self, frame, all_faces=False, timeout=None):
+        """
+        Detect the persona in a decoded frame, batched with other callers.
+
+        Blocks the calling thread until the frame's batch has run.
+
+        Raises:
+            TimeoutError: No result within timeout seconds
+            OverBudgetError: Dropped because it could not meet the latency
+                budget
+        """
+        request = _FrameRequest(frame, all_faces)
+        self._queue.put(request)
+
+        if not request.done.wait(timeout):
+            # Keep abandoned frames from taking batch slots from live ones
+            request.cancelled = True
+            with self._lock:
+                self.cancelled += 1
+            raise TimeoutError('Persona detection timed out')
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def _batch_limit(self, oldest):
+        """Frames the batch may hold without breaking the latency budget."""
+        if self.latency_budget is None or self.frame_cost is None:
+            return self.max_batch
+
+        remaining = self.latency_budget - (time.monotonic() - oldest.arrival)
+        return max(1, min(self.max_batch, int(remaining / self.frame_cost)))
+
+    def _too_late(self, request):
+        """True if even a batch of one would finish past the budget."""
+        if self.latency_budget is None or self.frame_cost is None:
+            return False
+        return time.monotonic() - request.arrival + self.frame_cost > self.latency_budget
+
+    def _shed(self, request):
+        request.error = OverBudgetError('Persona detection is over its latency budget')
+        with self._lock:
+            self.shed += 1
+        request.done.set()
+
+    def _collect(self, first):
+        batch = [first]
+        deadline = first.arrival + self.window
+
+        while len(batch) < self._batch_limit(first):
+            remaining = deadline - time.monotonic()
+            try:
+                request = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                self._queue.put(None)  # Stop after this batch
+                break
+            if request.cancelled:
+                continue
+            if self._too_late(request):
+                self._shed(request)
+                continue
+            batch.append(request)
+
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            if first.cancelled:
+                continue
+            if self._too_late(first):
+                self._shed(first)
+                continue
+
+            batch = self._collect(first)
+            started = time.monotonic()
+            try:
+                all_faces = any(request.all_faces for request in batch)
+                results = self.detector.detect_personas_in_frames(
+                    [request.frame for request in batch], all_faces=all_faces)
+                for request, result in zip(batch, results):
+                    if all_faces and not request.all_faces:
+                        result.pop('faces', None)
+                    result['batch_size'] = len(batch)
+                    request.result = result
+            except Exception as e:
+                for request in batch:
+                    request.error = e
+
+            finished = time.monotonic()
+            cost = (finished - started) / len(batch)
+            self.frame_cost = cost if self.frame_cost is None else 0.8 * self.frame_cost + 0.2 * cost
+
+            with self._lock:
+                self.requests += len(batch)
+                self.batches += 1
+                self.batch_sizes.append(len(batch))
+                self.latencies.extend(finished - request.arrival for request in batch)
+
+            for request in batch:
+                request.done.set()
+
+    def metrics(self):
+        """Batching and latency statistics over the recent history."""
+        with self._lock:
+            latencies = sorted(self.latencies)
+            sizes = list(self.batch_sizes)
+
+        def percentile(p):
+            if not latencies:
+                return 0.0
+            return latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))] * 1000
+
+        return {
+            'requests': self.requests,
+            'batches': self.batches,
+            'shed': self.shed,
+            'cancelled': self.cancelled,
+            'mean_batch_size': sum(sizes) / len(sizes) if sizes else 0.0,
+            'queued': self._queue.qsize(),
+            'frame_cost_ms': (self.frame_cost or 0.0) * 1000,
+            'p50_ms': percentile(50),
+            'p99_ms': percentile(99),
+            'window_ms': self.window * 1000,
+            'max_batch': self.max_batch,
+            'latency_budget_ms': self.latency_budget * 1000 if self.latency_budget else None
+        }
+
+    def close(self):
+        """Finish the queued batches and stop the batch thread."""
+        self._queue.put(None)
+        self._thread.join()
+
+
+class DetectionRequestHandler(BaseHTTPRequestHandler):
+    """HTTP front end for a MicroBatcher (server.batcher)."""
+
+    server_version = 'PersonaDetection/1.0'
+
+    def _send_json(self, status, data):
+        body = json.dumps(data, default=_json_default).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == '/health':
+            self._send_json(200, {'ok': True})
+        elif path == '/metrics':
+            self._send_json(200, self.server.batcher.metrics())
+        else:
+            self._send_json(404, {'error': 'Not found'})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != '/detect':
+            self._send_json(404, {'error': 'Not found'})
+            return
+
+        try:
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            all_faces = parse_qs(url.query).get('all_faces', ['0'])[0] in ('1', 'true')
+
+            if self.headers.get('Content-Type', '').startswith('application/json'):
+                request = json.loads(body)
+                frame = request['frame']
+                all_faces = request.get('all_faces', all_faces)
+            else:
+                frame = body
+
+            # Decode here so JPEG decoding runs in parallel across clients
+            image = decode_frame(frame)
+            if image is None:
+                raise ValueError('Could not decode frame')
+        except (KeyError, ValueError, TypeError) as e:
+            self._send_json(400, {'error': str(e)})
+            return
+
+        try:
+            result = self.server.batcher.submit(image, all_faces=all_faces,
+                                                timeout=self.server.request_timeout)
+        except (TimeoutError, OverBudgetError) as e:
+            self._send_json(503, {'error': str(e)})
+            return
+        except Exception as e:
+            self._send_json(500, {'error': str(e)})
+            return
+
+        self._send_json(200, result)
+
+    def address_string(self):
+        # Unix socket peers have no address
+        return self.client_address[0] if self.client_address else 'unix'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            sys.stderr.write(f"{self.address_string()} - {format % args}\n")
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self):
+        socketserver.UnixStreamServer.server_bind(self)
+        self.server_name = 'localhost'
+        self.server_port = 0
+
+
+def create_server(batcher, host='127.0.0.1', port=8765, unix_socket=None,
+                  request_timeout=10.0, verbose=False):
+    """
+    Build the HTTP server for a batcher (call serve_forever() on it).
+
+    Args:
+        batcher: MicroBatcher that runs the detections
+        host, port: TCP address (ignored with unix_socket)
+        unix_socket: Serve on this Unix socket path instead of TCP
+        request_timeout: Seconds a request may wait for its batch
+        verbose: Log every request to stderr
+    """
+    if unix_socket:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(unix_socket)
+        server = ThreadingUnixHTTPServer(unix_socket, DetectionRequestHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), DetectionRequestHandler)
+
+    server.batcher = batcher
+    server.request_timeout = request_timeout
+    server.verbose = verbose
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve MemoryMesh persona detection with micro-batching')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix-socket', help='Serve on a Unix socket instead of TCP')
+    parser.add_argument('--window-ms', type=float, default=5,
+                       help='How long a batch waits for more frames')
+    parser.add_argument('--max-batch', type=int, default=8, help='Largest batch')
+    parser.add_argument('--latency-budget-ms', type=float,
+                       help='Shrink batches to keep requests under this latency')
+    parser.add_argument('--request-timeout', type=float, default=10.0,
+                       help='Seconds a request may wait before a 503')
+    parser.add_argument('--max-detection-dim', type=int,
+                       help='PersonaDetector max_detection_dim')
+    parser.add_argument('--backend', choices=PersonaDetector.BACKENDS, default='auto',
+                       help='PersonaDetector backend')
+    parser.add_argument('--verbose', action='store_true', help='Log every request')
+
+    args = parser.parse_args()
+
+    detector = PersonaDetector(max_detection_dim=args.max_detection_dim, backend=args.backend)
+    batcher = MicroBatcher(detector, window_ms=args.window_ms, max_batch=args.max_batch,
+                           latency_budget_ms=args.latency_budget_ms)
+    server = create_server(batcher, host=args.host, port=args.port, unix_socket=args.unix_socket,
+                           request_timeout=args.request_timeout, verbose=args.verbose)
+
+    where = args.unix_socket or f"http://{args.host}:{args.port}"
+    print(f"🚀 Persona detection service on {where} "
+          f"(window {args.window_ms}ms, batch <= {args.max_batch})", file=sys.stderr)
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        batcher.close()
+        if args.unix_socket:
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(args.unix_socket)
+
+
+if __name__ == "__main__":
+    main()
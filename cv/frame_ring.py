@@ -0,0 +1,232 @@
+"""
+Shared-Memory Frame Ring Buffer for MemoryMesh
+Lets a capture process hand raw BGR frames to PersonaDetector through
+multiprocessing.shared_memory, with no JPEG/base64 round trip and no copies.
+"""
+
+import time
+import numpy as np
+from multiprocessing import shared_memory
+
+
+def _attach_shared_memory(name):
+    """Attach to an existing segment without letting this process unlink it."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13 registers every attachment with the resource
+        # tracker, which would destroy the producer's segment on exit
+        from multiprocessing import resource_tracker
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+
+class FrameRingBuffer:
+    """
+    Fixed-size ring of raw BGR frame slots in shared memory.
+
+    Memory layout:
+        int64 header: [height, width, slots, write_seq, finished]
+        int64 slot states: one seqlock word per slot, odd while the
+            producer is writing, 2 * seq once frame `seq` is complete
+        float64 slot timestamps (time.monotonic() at commit)
+        uint8 frames: slots x height x width x 3
+
+    One producer writes frames with write() (or begin_write()/commit_write()
+    to capture straight into a slot). Consumers read slots in place: a frame
+    is a view into shared memory, valid until the producer wraps around to
+    its slot, which is_current() detects.
+    """
+
+    HEADER_WORDS = 5
+    POLICIES = ('latest', 'fifo')
+
+    def __init__(self, shm, owner):
+        """Use create() or attach() instead."""
+        self.shm = shm
+        self.owner = owner
+        self.dropped = 0
+        self.torn = 0
+
+        header = np.ndarray((self.HEADER_WORDS,), dtype=np.int64, buffer=shm.buf)
+        self.height, self.width, self.slots = (int(v) for v in header[:3])
+        self._header = header
+        self._build_views()
+
+    @classmethod
+    def _layout(cls, height, width, slots):
+        """Byte offsets of the slot states, timestamps and frames, and the total size."""
+        states_offset = cls.HEADER_WORDS * 8
+        timestamps_offset = states_offset + slots * 8
+        # Keep frames cache-line aligned
+        frames_offset = (timestamps_offset + slots * 8 + 63) // 64 * 64
+        total = frames_offset + slots * height * width * 3
+        return states_offset, timestamps_offset, frames_offset, total
+
+    def _build_views(self):
+        states_offset, timestamps_offset, frames_offset, _ = self._layout(
+            self.height, self.width, self.slots)
+        buf = self.shm.buf
+
+        self._states = np.ndarray((self.slots,), dtype=np.int64, buffer=buf, offset=states_offset)
+        self._timestamps = np.ndarray((self.slots,), dtype=np.float64, buffer=buf, offset=timestamps_offset)
+        self._frames = np.ndarray((self.slots, self.height, self.width, 3), dtype=np.uint8,
+                                  buffer=buf, offset=frames_offset)
+
+    @classmethod
+    def create(cls, width, height, slots=4, name=None):
+        """
+        Create a new ring (producer side).
+
+        Args:
+            width: Frame width in pixels
+            height: Frame height in pixels
+            slots: Number of frame slots; more slots give consumers longer
+                before a frame they are analyzing gets overwritten
+            name: Shared memory name (random if None)
+        """
+        if slots < 2:
+            raise ValueError("A ring needs at least 2 slots")
+
+        _, _, _, total = cls._layout(height, width, slots)
+        shm = shared_memory.SharedMemory(name=name, create=True, size=total)
+
+        header = np.ndarray((cls.HEADER_WORDS,), dtype=np.int64, buffer=shm.buf)
+        header[:] = [height, width, slots, 0, 0]
+
+        ring = cls(shm, owner=True)
+        ring._states[:] = 0
+        return ring
+
+    @classmethod
+    def attach(cls, name):
+        """Attach to an existing ring by name (consumer side)."""
+        return cls(_attach_shared_memory(name), owner=False)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @property
+    def write_sequence(self):
+        """Sequence number of the newest complete frame (0 if none)."""
+        return int(self._header[3])
+
+    @property
+    def finished(self):
+        return bool(self._header[4])
+
+    # Producer side
+
+    def begin_write(self):
+        """
+        Reserve the next slot for writing.
+
+        Returns:
+            tuple: (seq, frame view) to fill in place, e.g. with
+            cap.read(image=view), then pass seq to commit_write()
+        """
+        seq = self.write_sequence + 1
+        slot = seq % self.slots
+        self._states[slot] = 2 * seq - 1  # Odd: write in progress
+        return seq, self._frames[slot]
+
+    def commit_write(self, seq):
+        """Publish a slot filled after begin_write()."""
+        slot = seq % self.slots
+        self._timestamps[slot] = time.monotonic()
+        self._states[slot] = 2 * seq
+        self._header[3] = seq
+
+    def write(self, frame):
+        """Copy a BGR frame into the next slot and publish it."""
+        seq, view = self.begin_write()
+        np.copyto(view, frame)
+        self.commit_write(seq)
+        return seq
+
+    def finish(self):
+        """Mark the end of the stream so consumers stop iterating."""
+        self._header[4] = 1
+
+    # Consumer side
+
+    def is_current(self, seq):
+        """True while frame `seq` is still intact in its slot."""
+        return self._states[seq % self.slots] == 2 * seq
+
+    def read(self, seq):
+        """
+        Get a zero-copy view of frame `seq`.
+
+        Returns:
+            tuple: (view, timestamp), or (None, None) if the frame is not
+            complete or was already overwritten
+        """
+        slot = seq % self.slots
+        if self._states[slot] != 2 * seq:
+            return None, None
+        return self._frames[slot], float(self._timestamps[slot])
+
+    def frames(self, policy='latest', max_age=None, timeout=None, poll_interval=0.002):
+        """
+        Yield (seq, frame view) for frames as the producer publishes them.
+
+        Args:
+            policy: 'latest' skips straight to the newest frame (stale
+                frames are dropped), 'fifo' yields frames in order and only
+                drops the ones already overwritten
+            max_age: Drop frames older than this many seconds
+            timeout: Stop after this many seconds without a new frame
+                (None waits forever, until the producer calls finish())
+            poll_interval: Sleep between polls while waiting
+
+        Dropped frames are counted in self.dropped.
+        """
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown policy: {policy}")
+
+        last_seq = self.write_sequence if policy == 'latest' else 0
+        idle_since = time.monotonic()
+
+        while True:
+            newest = self.write_sequence
+
+            if newest <= last_seq:
+                if self.finished:
+                    return
+                if timeout is not None and time.monotonic() - idle_since > timeout:
+                    return
+                time.sleep(poll_interval)
+                continue
+
+            if policy == 'latest':
+                seq = newest
+            else:
+                seq = last_seq + 1
+                # When behind, skip to the oldest frame that is neither
+                # overwritten nor the next slot the producer will reuse
+                seq = max(seq, newest - self.slots + 2)
+
+            self.dropped += seq - last_seq - 1
+            last_seq = seq
+            idle_since = time.monotonic()
+
+            frame, timestamp = self.read(seq)
+            if frame is None:
+                self.dropped += 1
+                continue
+
+            if max_age is not None and time.monotonic() - timestamp > max_age:
+                self.dropped += 1
+                continue
+
+            yield seq, frame
+
+    def close(self):
+        """Detach from the ring; the producer also frees it."""
+        self._header = self._states = self._timestamps = self._frames = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()